@@ -0,0 +1,104 @@
+"""
+Server-side chatbot sessions with summarised history
+"""
+import os
+import time
+import uuid
+import threading
+import logging
+from typing import List, Dict, Optional, Callable
+
+try:
+    from context_builder import count_tokens, truncate_to_tokens, SUMMARY_HEADER, SUMMARY_SHARE
+except ImportError:
+    from backend.context_builder import count_tokens, truncate_to_tokens, SUMMARY_HEADER, SUMMARY_SHARE
+
+logger = logging.getLogger(__name__)
+
+# Messages always kept verbatim when older history is folded into the summary
+KEEP_RECENT_MESSAGES = 4
+
+class ChatSession:
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.summary = ""
+        self.messages: List[Dict] = []
+        self.questions: List[str] = []
+        self.updated_at = time.time()
+        self.lock = threading.Lock()
+
+    def load_history(self, history: List[Dict]):
+        """Seed the session from a client-supplied conversation history"""
+        for msg in history:
+            role = msg.get('role') or msg.get('sender', 'user')
+            text = msg.get('text', '') or msg.get('content', '')
+            if text:
+                self.messages.append({'role': 'user' if role == 'user' else 'assistant', 'text': text})
+                if role == 'user':
+                    self.questions.append(text)
+
+class SessionStore:
+    """In-memory sessions keyed by id, expired after `ttl` seconds of inactivity"""
+
+    def __init__(self, ttl: Optional[float] = None, max_sessions: Optional[int] = None,
+                 max_history_tokens: Optional[int] = None):
+        self.ttl = ttl or float(os.getenv("CHAT_SESSION_TTL", "3600"))
+        self.max_sessions = max_sessions or int(os.getenv("CHAT_MAX_SESSIONS", "1000"))
+        self.max_history_tokens = max_history_tokens or int(os.getenv("RAG_HISTORY_TOKENS", "400"))
+        self._sessions: Dict[str, ChatSession] = {}
+        self._lock = threading.Lock()
+
+    def _evict(self):
+        now = time.time()
+        for session_id in [s for s, session in self._sessions.items() if now - session.updated_at > self.ttl]:
+            del self._sessions[session_id]
+        while len(self._sessions) >= self.max_sessions:
+            oldest = min(self._sessions.values(), key=lambda session: session.updated_at)
+            del self._sessions[oldest.id]
+
+    def get(self, session_id: Optional[str]) -> Optional[ChatSession]:
+        with self._lock:
+            session = self._sessions.get(session_id) if session_id else None
+            if session and time.time() - session.updated_at > self.ttl:
+                del self._sessions[session_id]
+                return None
+            return session
+
+    def create(self) -> ChatSession:
+        with self._lock:
+            self._evict()
+            session = ChatSession(uuid.uuid4().hex)
+            self._sessions[session.id] = session
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def record(self, session: ChatSession, question: str, answer: str,
+               summarize: Optional[Callable[[str, List[Dict]], str]] = None):
+        """Append an exchange and fold older messages into the summary once over budget"""
+        with session.lock:
+            session.messages.append({'role': 'user', 'text': question})
+            session.messages.append({'role': 'assistant', 'text': answer})
+            session.questions.append(question)
+            session.updated_at = time.time()
+
+            history_tokens = sum(count_tokens(msg['text']) for msg in session.messages)
+            if history_tokens <= self.max_history_tokens or len(session.messages) <= KEEP_RECENT_MESSAGES:
+                return
+
+            older = session.messages[:-KEEP_RECENT_MESSAGES]
+            session.messages = session.messages[-KEEP_RECENT_MESSAGES:]
+            summary = None
+            if summarize:
+                try:
+                    summary = summarize(session.summary, older)
+                except Exception as e:
+                    logger.error(f"Error summarising conversation {session.id}: {str(e)}")
+            if not summary:
+                # Fall back to keeping the most recent folded text within the summary's share
+                folded = " ".join(f"{msg['role']}: {msg['text']}" for msg in older)
+                budget = self.max_history_tokens // SUMMARY_SHARE - count_tokens(SUMMARY_HEADER)
+                summary = truncate_to_tokens(f"{session.summary} {folded}", budget, keep_end=True)
+            session.summary = summary
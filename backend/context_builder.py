@@ -0,0 +1,245 @@
+"""
+Token-budgeted context assembly for RAG prompts
+"""
+import os
+import re
+import logging
+from typing import List, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Sentence boundaries: Latin and Devanagari/Tamil danda punctuation, or line breaks
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?।॥])\s+|\n+')
+PUNCTUATION = '.,;:!?()[]{}"\'`“”‘’-–—।॥'
+PAGE_MARKER = re.compile(r'--- Page \d+ ---')
+# Longest piece scored as one unit, so unpunctuated OCR text still splits into selectable parts
+MAX_SENTENCE_TOKENS = 60
+# Neighbouring chunks share KnowledgeBase.chunk_text's 200-word overlap; shorter
+# suffix/prefix matches are coincidental repeats of real words
+MIN_CHUNK_OVERLAP = 200
+SUMMARY_HEADER = "Summary of earlier conversation: "
+# The summary gets at most 1/SUMMARY_SHARE of the history budget, and each message at
+# most 1/MESSAGE_SHARE of what is left, so the newest exchange always fits
+SUMMARY_SHARE = 4
+MESSAGE_SHARE = 2
+
+_encoding = None
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken when available, else estimate from the script"""
+    global _encoding
+    if not text:
+        return 0
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    # ~4 characters per token for ASCII; Tamil and other Indic scripts encode to
+    # roughly one token or more per character
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+def split_to_budget(text: str, max_tokens: int) -> List[str]:
+    """Split text into consecutive word windows of at most `max_tokens` tokens each"""
+    pieces = []
+    current: List[str] = []
+    used = 0
+    for word in text.split():
+        cost = count_tokens(' ' + word)
+        if current and used + cost > max_tokens:
+            pieces.append(' '.join(current))
+            current = []
+            used = 0
+        current.append(word)
+        used += cost
+    if current:
+        pieces.append(' '.join(current))
+    return pieces
+
+def truncate_to_tokens(text: str, max_tokens: int, keep_end: bool = False) -> str:
+    """Keep the leading (or trailing) words of text that fit in `max_tokens` tokens"""
+    words = text.split()
+    if keep_end:
+        words = words[::-1]
+    kept = []
+    used = 0
+    for word in words:
+        used += count_tokens(' ' + word)
+        if used > max_tokens:
+            break
+        kept.append(word)
+    if keep_end:
+        kept = kept[::-1]
+    return ' '.join(kept)
+
+def split_sentences(text: str, max_tokens: int = MAX_SENTENCE_TOKENS) -> List[str]:
+    """Split text into sentences, dropping page markers and breaking up over-long sentences"""
+    sentences = []
+    for sentence in SENTENCE_BOUNDARY.split(PAGE_MARKER.sub(' ', text)):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if count_tokens(sentence) > max_tokens:
+            sentences.extend(split_to_budget(sentence, max_tokens))
+        else:
+            sentences.append(sentence)
+    return sentences
+
+def _terms(text: str) -> set:
+    # Whitespace split keeps Tamil words intact (\w would break on vowel signs)
+    terms = set()
+    for word in text.lower().split():
+        word = word.strip(PUNCTUATION)
+        if len(word) > 2:
+            terms.add(word)
+    return terms
+
+def _word_overlap(previous: List[str], following: List[str], min_overlap: int = MIN_CHUNK_OVERLAP) -> int:
+    """Length of the longest suffix of `previous` that is a prefix of `following`,
+    or 0 if shorter than `min_overlap` (a final chunk may be wholly contained)"""
+    if not previous or not following:
+        return 0
+    best = 0
+    for start in range(max(0, len(previous) - len(following)), len(previous)):
+        if previous[start] == following[0]:
+            size = len(previous) - start
+            if previous[start:] == following[:size]:
+                best = size
+                break
+    if best < min(min_overlap, len(following)):
+        return 0
+    return best
+
+def merge_overlapping_chunks(chunks: List[Dict]) -> List[Dict]:
+    """Merge neighbouring chunks of the same source, removing the words the chunker repeats"""
+    passages: List[Dict] = []
+    by_source: Dict[str, List[Dict]] = {}
+    for chunk in chunks:
+        if chunk.get('chunk_index') is None:
+            passages.append(dict(chunk))
+        else:
+            by_source.setdefault(chunk['source'], []).append(chunk)
+
+    for source, source_chunks in by_source.items():
+        source_chunks = sorted(source_chunks, key=lambda c: c['chunk_index'])
+        current = dict(source_chunks[0])
+        words = current['text'].split()
+        for chunk in source_chunks[1:]:
+            next_words = chunk['text'].split()
+            if chunk['chunk_index'] == current['chunk_index'] + 1:
+                overlap = _word_overlap(words, next_words)
+                words = words + next_words[overlap:]
+                current['chunk_index'] = chunk['chunk_index']
+                current['similarity'] = max(current.get('similarity', 0.0), chunk.get('similarity', 0.0))
+            else:
+                current['text'] = ' '.join(words)
+                passages.append(current)
+                current = dict(chunk)
+                words = next_words
+        current['text'] = ' '.join(words)
+        passages.append(current)
+
+    passages.sort(key=lambda p: p.get('similarity', 0.0), reverse=True)
+    return passages
+
+class ContextBuilder:
+    """Fit retrieved chunks and conversation history into fixed token budgets"""
+
+    def __init__(self, max_context_tokens: Optional[int] = None, max_history_tokens: Optional[int] = None):
+        self.max_context_tokens = max_context_tokens or int(os.getenv("RAG_CONTEXT_TOKENS", "1500"))
+        self.max_history_tokens = max_history_tokens or int(os.getenv("RAG_HISTORY_TOKENS", "400"))
+
+    def trim_passage(self, text: str, query_terms: set, budget: int, seen: set) -> str:
+        """Keep the sentences most relevant to the query that fit in `budget` tokens"""
+        sentences = []
+        for position, sentence in enumerate(split_sentences(text, min(budget, MAX_SENTENCE_TOKENS))):
+            key = ' '.join(sentence.lower().split())
+            if key in seen:
+                continue
+            terms = _terms(sentence)
+            score = len(terms & query_terms) / (1 + len(terms) ** 0.5) if terms else 0.0
+            sentences.append((score, position, sentence, key))
+
+        chosen = []
+        used = 0
+        # Highest-scoring first; ties keep document order
+        for score, position, sentence, key in sorted(sentences, key=lambda s: (-s[0], s[1])):
+            cost = count_tokens(sentence)
+            if used + cost > budget:
+                continue
+            chosen.append((position, sentence, key))
+            used += cost
+
+        chosen.sort()
+        for _, _, key in chosen:
+            seen.add(key)
+        return ' '.join(sentence for _, sentence, _ in chosen)
+
+    def build_context(self, query: str, chunks: List[Dict]) -> Tuple[str, List[Dict]]:
+        """Assemble deduplicated, query-trimmed context within the context budget"""
+        passages = merge_overlapping_chunks(chunks)
+        query_terms = _terms(query)
+        seen: set = set()
+        remaining = self.max_context_tokens
+        parts = []
+        used_passages = []
+        for i, passage in enumerate(passages):
+            header = f"[From {passage['source']}]\n"
+            # Split what is left evenly so lower-ranked passages still get a share
+            share = remaining // (len(passages) - i) - count_tokens(header)
+            if share <= 0:
+                continue
+            text = self.trim_passage(passage['text'], query_terms, share, seen)
+            if not text:
+                continue
+            part = header + text
+            parts.append(part)
+            used_passages.append(passage)
+            remaining -= count_tokens(part)
+
+        if not parts and passages:
+            # Nothing selectable fit (e.g. a single oversized word); fall back to the top passage's opening
+            top = passages[0]
+            header = f"[From {top['source']}]\n"
+            text = truncate_to_tokens(PAGE_MARKER.sub(' ', top['text']), self.max_context_tokens - count_tokens(header))
+            if text:
+                parts.append(header + text)
+                used_passages.append(top)
+        return "\n\n".join(parts), used_passages
+
+    def build_history(self, messages: List[Dict], summary: str = "") -> str:
+        """Render the summary plus the most recent messages that fit the history budget"""
+        remaining = self.max_history_tokens
+        lines = []
+        if summary:
+            # Trim rather than drop; the most recent part of the summary matters most
+            summary = truncate_to_tokens(
+                summary, remaining // SUMMARY_SHARE - count_tokens(SUMMARY_HEADER), keep_end=True
+            )
+            if summary:
+                lines.append(SUMMARY_HEADER + summary)
+                remaining -= count_tokens(lines[0])
+
+        message_cap = remaining // MESSAGE_SHARE
+        recent = []
+        for msg in reversed(messages):
+            role = msg.get('role') or msg.get('sender', 'user')
+            text = msg.get('text', '') or msg.get('content', '')
+            if not text:
+                continue
+            prefix = f"{'User' if role == 'user' else 'Assistant'}: "
+            limit = min(message_cap, remaining) - count_tokens(prefix)
+            if count_tokens(text) > limit:
+                # Long answers are trimmed instead of emptying the history
+                text = truncate_to_tokens(text, limit)
+            if not text:
+                break
+            line = prefix + text
+            recent.append(line)
+            remaining -= count_tokens(line)
+
+        return "\n".join(lines + recent[::-1])
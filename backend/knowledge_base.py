@@ -2,13 +2,22 @@
 Knowledge Base module for processing PDFs and creating embeddings for RAG
 """
 import os
-import PyPDF2
-from openai import OpenAI
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
 from dotenv import load_dotenv
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 import logging
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
+
+try:
+    from context_builder import ContextBuilder
+except ImportError:
+    from backend.context_builder import ContextBuilder
+
+# PyPDF2, OpenAI, scikit-learn and PyMuPDF are imported where they are used
+# so that workers without the chatbot subsystem never pay for them.
 
 load_dotenv()
 
@@ -17,26 +26,195 @@ logger = logging.getLogger(__name__)
 class KnowledgeBase:
     def __init__(self, data_folder: str = "/Users/anupamar/Documents/ee/data"):
         self.data_folder = data_folder
-        self.openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.documents: List[Dict] = []
-        self.embeddings: List[List[float]] = []
+        self._openai_client = None
+        # Published (documents, embeddings, files) snapshot; replaced as a whole so
+        # readers never observe a half-built index. `files` holds the per-file state
+        # used for incremental updates:
+        # filename -> {'signature': (mtime, size), 'chunks': [(position, text, embedding), ...]}
+        self._index: Tuple[List[Dict], np.ndarray, Dict[str, Dict]] = ([], np.empty((0, 0)), {})
+        self._update_lock = threading.Lock()
+        self._update_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kb-reindex")
+        self._pending_updates = 0
+        self._pending_lock = threading.Lock()
+        self._watch_stop: Optional[threading.Event] = None
+        self._watch_thread: Optional[threading.Thread] = None
         self.initialized = False
+        self.context_builder = ContextBuilder()
+        # Scanned-page OCR settings
+        self.ocr_engine = None
+        self.ocr_batch_size = int(os.getenv("KB_OCR_BATCH_SIZE", "8"))
+        self._ocr_lock = threading.Lock()
+        self.ocr_dpi = int(os.getenv("KB_OCR_DPI", "200"))
+        self.ocr_cache_dir = os.getenv(
+            "KB_OCR_CACHE_DIR",
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ocr_cache")
+        )
         
+    @property
+    def documents(self) -> List[Dict]:
+        return self._index[0]
+    
+    @property
+    def embeddings(self) -> np.ndarray:
+        return self._index[1]
+    
+    @property
+    def _files(self) -> Dict[str, Dict]:
+        return self._index[2]
+    
+    @property
+    def reindexing(self) -> bool:
+        """Whether background index updates are queued or running"""
+        return self._pending_updates > 0
+    
+    @property
+    def openai_client(self):
+        """Create the OpenAI client on first use"""
+        if self._openai_client is None:
+            from openai import OpenAI
+            self._openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._openai_client
+    
     def extract_text_from_pdf(self, pdf_path: str) -> str:
-        """Extract text from a PDF file"""
+        """Extract text from a PDF file, OCR-ing pages that have no text layer"""
+        import PyPDF2
         try:
-            text = ""
+            page_texts: Dict[int, str] = {}
+            scanned_pages: List[int] = []
             with open(pdf_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
                 for page_num, page in enumerate(pdf_reader.pages):
                     page_text = page.extract_text()
-                    if page_text:
-                        text += f"\n\n--- Page {page_num + 1} ---\n\n{page_text}"
+                    if page_text and page_text.strip():
+                        page_texts[page_num] = page_text
+                    else:
+                        scanned_pages.append(page_num)
+            
+            if scanned_pages:
+                logger.info(f"{len(scanned_pages)} page(s) in {os.path.basename(pdf_path)} have no text layer, running OCR")
+                try:
+                    page_texts.update(self.ocr_scanned_pages(pdf_path, scanned_pages))
+                except Exception as e:
+                    # Keep the text-layer pages even if the scanned ones cannot be OCR'd
+                    logger.error(f"Error running OCR on scanned pages of {pdf_path}: {str(e)}")
+            
+            text = ""
+            for page_num in sorted(page_texts):
+                if page_texts[page_num]:
+                    text += f"\n\n--- Page {page_num + 1} ---\n\n{page_texts[page_num]}"
             return text.strip()
         except Exception as e:
             logger.error(f"Error extracting text from {pdf_path}: {str(e)}")
             return ""
     
+    def get_ocr_engine(self):
+        """Create the ocr_tamil engine on first use"""
+        if self.ocr_engine is None:
+            from ocr_tamil.ocr import OCR
+            self.ocr_engine = OCR(detect=True, batch_size=self.ocr_batch_size)
+        return self.ocr_engine
+    
+    def render_page(self, doc, page_num: int) -> bytes:
+        """Render a single page of an open PyMuPDF document to PNG bytes"""
+        return doc[page_num].get_pixmap(dpi=self.ocr_dpi).tobytes("png")
+    
+    def _read_ocr_cache(self, page_hash: str):
+        cache_path = os.path.join(self.ocr_cache_dir, f"{page_hash}.txt")
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        return None
+    
+    def _write_ocr_cache(self, page_hash: str, text: str):
+        try:
+            os.makedirs(self.ocr_cache_dir, exist_ok=True)
+            cache_path = os.path.join(self.ocr_cache_dir, f"{page_hash}.txt")
+            tmp_path = f"{cache_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write OCR cache entry {page_hash}: {str(e)}")
+    
+    def _ocr_images(self, images: List[bytes]) -> List[str]:
+        """Run one batch of page images through the OCR engine"""
+        tmp_paths = []
+        try:
+            for image in images:
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp_file:
+                    tmp_file.write(image)
+                    tmp_paths.append(tmp_file.name)
+            
+            # ocr_tamil models are not thread-safe
+            with self._ocr_lock:
+                text_list = self.get_ocr_engine().predict(tmp_paths)
+            texts = []
+            for i in range(len(tmp_paths)):
+                result = text_list[i] if text_list and i < len(text_list) else []
+                if isinstance(result, str):
+                    texts.append(result.strip())
+                else:
+                    texts.append(" ".join(str(t) for t in result).strip())
+            return texts
+        finally:
+            for tmp_path in tmp_paths:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+    
+    def ocr_scanned_pages(self, pdf_path: str, page_numbers: List[int]) -> Dict[int, str]:
+        """OCR image-only pages in batches, caching results per page hash"""
+        try:
+            import fitz  # PyMuPDF
+        except ImportError:
+            logger.warning(f"PyMuPDF not installed, skipping OCR of {len(page_numbers)} scanned page(s) in {pdf_path}")
+            return {}
+        
+        results: Dict[int, str] = {}
+        
+        def collect(pending, future):
+            try:
+                texts = future.result()
+            except Exception as e:
+                logger.error(f"Error running OCR on pages of {pdf_path}: {str(e)}")
+                return
+            for (page_num, page_hash), text in zip(pending, texts):
+                self._write_ocr_cache(page_hash, text)
+                results[page_num] = text
+        
+        # PyMuPDF is not thread-safe, so pages are rendered here from one open
+        # document while a single worker OCRs the previous batch
+        in_flight = None
+        with fitz.open(pdf_path) as doc, ThreadPoolExecutor(max_workers=1, thread_name_prefix="kb-ocr") as ocr_pool:
+            # Render and OCR one batch at a time to bound memory on large scans
+            for start in range(0, len(page_numbers), self.ocr_batch_size):
+                batch = page_numbers[start:start + self.ocr_batch_size]
+                pending = []
+                images = []
+                for page_num in batch:
+                    try:
+                        image = self.render_page(doc, page_num)
+                    except Exception as e:
+                        logger.error(f"Error rendering page {page_num + 1} of {pdf_path}: {str(e)}")
+                        continue
+                    page_hash = hashlib.sha256(image).hexdigest()
+                    cached = self._read_ocr_cache(page_hash)
+                    if cached is not None:
+                        results[page_num] = cached
+                    else:
+                        pending.append((page_num, page_hash))
+                        images.append(image)
+                
+                if in_flight:
+                    collect(*in_flight)
+                    in_flight = None
+                if pending:
+                    in_flight = (pending, ocr_pool.submit(self._ocr_images, images))
+            
+            if in_flight:
+                collect(*in_flight)
+        
+        return results
+    
     def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
         """Split text into chunks with overlap"""
         chunks = []
@@ -61,6 +239,148 @@ class KnowledgeBase:
             logger.error(f"Error getting embedding: {str(e)}")
             return []
     
+    def _file_signature(self, pdf_path: str) -> Tuple[float, int]:
+        stat = os.stat(pdf_path)
+        return (stat.st_mtime, stat.st_size)
+    
+    def _list_pdfs(self) -> Dict[str, str]:
+        """Map PDF filenames in the data folder to their paths"""
+        return {
+            f: os.path.join(self.data_folder, f)
+            for f in os.listdir(self.data_folder) if f.lower().endswith('.pdf')
+        }
+    
+    def _embed_file(self, pdf_path: str, previous: Optional[Dict] = None) -> Dict:
+        """Chunk a PDF and embed only chunks whose text is not already indexed for it"""
+        pdf_file = os.path.basename(pdf_path)
+        signature = self._file_signature(pdf_path)
+        known = {text: embedding for _, text, embedding in previous['chunks']} if previous else {}
+        
+        text = self.extract_text_from_pdf(pdf_path)
+        if not text:
+            logger.warning(f"No text extracted from {pdf_file}")
+        
+        chunks = []
+        embedded = 0
+        for position, chunk in enumerate(self.chunk_text(text)):
+            embedding = known.get(chunk)
+            if embedding is None:
+                embedding = self.get_embedding(chunk)
+                embedded += 1
+            if embedding:
+                # Keep the original position so neighbours stay identifiable if an embedding fails
+                chunks.append((position, chunk, embedding))
+        
+        logger.info(f"Indexed {pdf_file}: {len(chunks)} chunks, {embedded} newly embedded")
+        return {'signature': signature, 'chunks': chunks}
+    
+    def _publish(self, files: Dict[str, Dict]):
+        """Build a fresh index from per-file state and swap it in atomically"""
+        documents = []
+        embeddings = []
+        for pdf_file in sorted(files):
+            for position, chunk, embedding in files[pdf_file]['chunks']:
+                documents.append({
+                    'text': chunk,
+                    'source': pdf_file,
+                    'chunk_index': position
+                })
+                embeddings.append(embedding)
+        matrix = np.array(embeddings, dtype=np.float32) if embeddings else np.empty((0, 0))
+        self._index = (documents, matrix, files)
+    
+    def add_document(self, pdf_path: str):
+        """Add or update a single PDF, re-embedding only its changed chunks"""
+        with self._update_lock:
+            pdf_file = os.path.basename(pdf_path)
+            files = dict(self._files)
+            files[pdf_file] = self._embed_file(pdf_path, files.get(pdf_file))
+            self._publish(files)
+            self.initialized = True
+    
+    def remove_document(self, pdf_file: str) -> bool:
+        """Remove a PDF's chunks from the index"""
+        with self._update_lock:
+            files = dict(self._files)
+            if files.pop(os.path.basename(pdf_file), None) is None:
+                return False
+            self._publish(files)
+            return True
+    
+    def sync(self) -> Dict[str, List[str]]:
+        """Bring the index in line with the data folder, touching only changed files"""
+        changes = {'added': [], 'updated': [], 'removed': []}
+        if not os.path.exists(self.data_folder):
+            logger.error(f"Data folder not found: {self.data_folder}")
+            return changes
+        
+        with self._update_lock:
+            # Work on a copy; readers keep seeing the published state until the swap
+            files = dict(self._files)
+            pdfs = self._list_pdfs()
+            for pdf_file in list(files):
+                if pdf_file not in pdfs:
+                    del files[pdf_file]
+                    changes['removed'].append(pdf_file)
+            
+            for pdf_file, pdf_path in sorted(pdfs.items()):
+                try:
+                    previous = files.get(pdf_file)
+                    if previous and previous['signature'] == self._file_signature(pdf_path):
+                        continue
+                    logger.info(f"Processing {pdf_file}...")
+                    files[pdf_file] = self._embed_file(pdf_path, previous)
+                    changes['updated' if previous else 'added'].append(pdf_file)
+                except OSError as e:
+                    # File vanished or is still being written; pick it up next sync
+                    logger.warning(f"Skipping {pdf_file}: {str(e)}")
+            
+            if any(changes.values()):
+                self._publish(files)
+        return changes
+    
+    def submit(self, fn, *args) -> Future:
+        """Run an index update in the background; updates are applied one at a time"""
+        with self._pending_lock:
+            self._pending_updates += 1
+        
+        def run():
+            try:
+                return fn(*args)
+            except Exception as e:
+                logger.error(f"Background knowledge base update failed: {str(e)}")
+                raise
+            finally:
+                with self._pending_lock:
+                    self._pending_updates -= 1
+        
+        return self._update_executor.submit(run)
+    
+    def start_watcher(self, interval: float = 5.0):
+        """Poll the data folder and apply changes as they appear"""
+        if self._watch_thread and self._watch_thread.is_alive():
+            return
+        self._watch_stop = threading.Event()
+        
+        def watch(stop: threading.Event):
+            while not stop.wait(interval):
+                try:
+                    # Run through the update queue so `reindexing` reflects watcher syncs
+                    changes = self.submit(self.sync).result()
+                    if any(changes.values()):
+                        logger.info(f"Knowledge base updated from data folder: {changes}")
+                except Exception as e:
+                    logger.error(f"Knowledge base watcher error: {str(e)}")
+        
+        self._watch_thread = threading.Thread(target=watch, args=(self._watch_stop,), name="kb-watcher", daemon=True)
+        self._watch_thread.start()
+        logger.info(f"Watching {self.data_folder} for PDF changes every {interval}s")
+    
+    def stop_watcher(self):
+        if self._watch_stop:
+            self._watch_stop.set()
+        self._watch_thread = None
+    
     def initialize(self):
         """Initialize knowledge base by processing all PDFs in data folder"""
         if self.initialized:
@@ -72,43 +392,27 @@ class KnowledgeBase:
             logger.error(f"Data folder not found: {self.data_folder}")
             return
         
-        # Process all PDF files
-        pdf_files = [f for f in os.listdir(self.data_folder) if f.endswith('.pdf')]
-        
-        if not pdf_files:
+        if not self._list_pdfs():
             logger.warning(f"No PDF files found in {self.data_folder}")
             return
         
-        for pdf_file in pdf_files:
-            pdf_path = os.path.join(self.data_folder, pdf_file)
-            logger.info(f"Processing {pdf_file}...")
-            
-            # Extract text
-            text = self.extract_text_from_pdf(pdf_path)
-            if not text:
-                logger.warning(f"No text extracted from {pdf_file}")
-                continue
-            
-            # Chunk the text
-            chunks = self.chunk_text(text)
-            
-            # Create embeddings for each chunk
-            for chunk_idx, chunk in enumerate(chunks):
-                embedding = self.get_embedding(chunk)
-                if embedding:
-                    self.documents.append({
-                        'text': chunk,
-                        'source': pdf_file,
-                        'chunk_index': chunk_idx
-                    })
-                    self.embeddings.append(embedding)
+        self.sync()
         
         self.initialized = True
-        logger.info(f"Knowledge base initialized with {len(self.documents)} chunks from {len(pdf_files)} PDFs")
+        logger.info(f"Knowledge base initialized with {len(self.documents)} chunks from {len(self._files)} PDFs")
+    
+    def list_documents(self) -> List[Dict]:
+        """Indexed PDFs with their chunk counts"""
+        return [
+            {'filename': pdf_file, 'num_chunks': len(entry['chunks'])}
+            for pdf_file, entry in sorted(self._files.items())
+        ]
     
     def search_relevant_chunks(self, query: str, top_k: int = 3) -> List[Dict]:
         """Search for relevant chunks based on query"""
-        if not self.initialized or not self.documents:
+        # Read the published snapshot once so a concurrent swap cannot mix indexes
+        documents, embeddings, _ = self._index
+        if not self.initialized or not documents:
             return []
         
         # Get query embedding
@@ -116,10 +420,12 @@ class KnowledgeBase:
         if not query_embedding:
             return []
         
+        from sklearn.metrics.pairwise import cosine_similarity
+        
         # Calculate similarities
         similarities = cosine_similarity(
             [query_embedding],
-            self.embeddings
+            embeddings
         )[0]
         
         # Get top k most similar chunks
@@ -128,35 +434,54 @@ class KnowledgeBase:
         results = []
         for idx in top_indices:
             results.append({
-                'text': self.documents[idx]['text'],
-                'source': self.documents[idx]['source'],
+                'text': documents[idx]['text'],
+                'source': documents[idx]['source'],
+                'chunk_index': documents[idx]['chunk_index'],
                 'similarity': float(similarities[idx])
             })
         
         return results
     
-    def generate_answer(self, query: str, context_chunks: List[Dict], conversation_history: List[Dict] = None) -> str:
+    def summarize_history(self, summary: str, messages: List[Dict]) -> str:
+        """Fold older conversation messages into a short running summary"""
+        transcript = "\n".join(
+            f"{'User' if msg.get('role') == 'user' else 'Assistant'}: {msg.get('text', '')}"
+            for msg in messages
+        )
+        prompt = f"""Update the summary of a conversation about Tamil OCR and Brahmi scripts. Keep the user's questions and key facts from the answers. Reply with the summary only, in at most 80 words.
+
+Current summary:
+{summary or "(none)"}
+
+New messages:
+{transcript}
+
+Updated summary:"""
+        response = self.openai_client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0,
+            max_tokens=150
+        )
+        return response.choices[0].message.content.strip()
+    
+    def generate_answer(self, query: str, context_chunks: List[Dict], conversation_history: List[Dict] = None,
+                        history_summary: str = "") -> str:
         """Generate answer using OpenAI with context from knowledge base"""
         if not context_chunks:
             return "I couldn't find relevant information in the knowledge base to answer your question."
         
-        # Build context from chunks
-        context = "\n\n".join([
-            f"[From {chunk['source']}]\n{chunk['text']}"
-            for chunk in context_chunks
-        ])
+        # Build deduplicated, query-trimmed context within the token budget
+        context, _ = self.context_builder.build_context(query, context_chunks)
+        if not context:
+            return "I couldn't find relevant information in the knowledge base to answer your question."
         
         # Build conversation history context if available
         conversation_context = ""
-        if conversation_history:
-            conv_text = []
-            for msg in conversation_history[-5:]:  # Last 5 messages for context
-                role = msg.get('role') or msg.get('sender', 'user')
-                text = msg.get('text', '') or msg.get('content', '')
-                if text:
-                    conv_text.append(f"{'User' if role == 'user' else 'Assistant'}: {text}")
+        if conversation_history or history_summary:
+            conv_text = self.context_builder.build_history(conversation_history or [], history_summary)
             if conv_text:
-                conversation_context = "\n\nPrevious conversation:\n" + "\n".join(conv_text)
+                conversation_context = "\n\nPrevious conversation:\n" + conv_text
         
         # Create prompt
         prompt = f"""You are a helpful AI assistant with access to a knowledge base about Tamil OCR, Brahmi scripts, and related topics.
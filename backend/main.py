@@ -1,24 +1,38 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import tensorflow as tf
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 import numpy as np
-from PIL import Image
+from PIL import Image, ImageSequence
 import io
 import base64
-from aksharamukha.transliterate import Transliterator
-from ocr_tamil.ocr import OCR
+import json
+import tempfile
+import threading
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 import logging
 import os
 import sys
-from typing import Optional
+from typing import Optional, Iterator, List
 from pydantic import BaseModel
+# tensorflow, ocr_tamil, aksharamukha and PyMuPDF are imported inside the
+# subsystems that use them, so a worker only pays for what it enables.
 # Import knowledge base - adjust path based on how the app is run
 try:
     from knowledge_base import knowledge_base
 except ImportError:
     # If running from project root
     from backend.knowledge_base import knowledge_base
+try:
+    from profiles import enabled_subsystems
+except ImportError:
+    from backend.profiles import enabled_subsystems
+try:
+    from chat_sessions import SessionStore, ChatSession
+except ImportError:
+    from backend.chat_sessions import SessionStore, ChatSession
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,6 +40,14 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Tamil OCR API", version="1.0.0")
 
+# Subsystems enabled for this worker (see profiles.py)
+ENABLED_SUBSYSTEMS = enabled_subsystems()
+
+def require_subsystem(name: str):
+    """Reject requests for subsystems disabled by the deployment profile"""
+    if name not in ENABLED_SUBSYSTEMS:
+        raise HTTPException(status_code=503, detail=f"The '{name}' subsystem is not enabled on this server")
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -42,13 +64,29 @@ ocr_handwritten = None
 ocr_natural = None
 ocr_initialized = False
 
+# Server-side chatbot sessions
+chat_sessions = SessionStore()
+
 # Model configuration
 IM_SHAPE = (224, 224, 3)  # Default ResNet input shape, adjust based on your model
 
+# Multi-page document configuration
+OCR_PAGE_BATCH_SIZE = int(os.getenv("OCR_PAGE_BATCH_SIZE", "4"))
+OCR_PDF_DPI = int(os.getenv("OCR_PDF_DPI", "200"))
+
+# ocr_tamil models are not thread-safe; predict calls are serialised per model
+ocr_locks = {"handwritten": threading.Lock(), "natural": threading.Lock()}
+
+def predict_ocr(ocr_model, ocr_type: str, image_paths: List[str]):
+    """Run OCR.predict while holding the model's lock"""
+    with ocr_locks[ocr_type]:
+        return ocr_model.predict(image_paths)
+
 def load_brahmi_model():
     """Load the Brahmi model once on startup"""
     global brahmi_model, model_loaded
     try:
+        import tensorflow as tf
         model_path = "/Users/anupamar/Documents/ee/model/best_model.h5"
         if os.path.exists(model_path):
             # Try to load the model with custom objects to handle potential issues
@@ -113,6 +151,8 @@ def initialize_ocr():
     """Initialize OCR models for handwritten and natural text"""
     global ocr_handwritten, ocr_natural, ocr_initialized
     try:
+        from ocr_tamil.ocr import OCR
+        
         # Initialize OCR for handwritten text
         ocr_handwritten = OCR(detect=True, details=2, batch_size=128)
         
@@ -140,16 +180,120 @@ def line_print(prediction):
             extracted_text += pred_text + " "
     return extracted_text.strip()
 
-@app.on_event("startup")
-async def startup_event():
-    """Load models on startup"""
-    load_brahmi_model()
-    initialize_ocr()
-    # Initialize knowledge base in background
+def detect_document_format(contents: bytes, filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """Return 'pdf' or 'tiff' for multi-page uploads, None for single images"""
+    name = (filename or "").lower()
+    content_type = (content_type or "").lower()
+    if contents.startswith(b"%PDF") or content_type == "application/pdf" or name.endswith(".pdf"):
+        return "pdf"
+    if contents[:4] in (b"II*\x00", b"MM\x00*") or content_type == "image/tiff" or name.endswith((".tif", ".tiff")):
+        return "tiff"
+    return None
+
+def iter_document_pages(contents: bytes, doc_format: str) -> Iterator[bytes]:
+    """Decode a PDF or TIFF lazily, yielding one page at a time as PNG bytes"""
+    if doc_format == "pdf":
+        try:
+            import fitz  # PyMuPDF
+        except ImportError:
+            raise RuntimeError("PDF uploads require PyMuPDF to be installed")
+        with fitz.open(stream=contents, filetype="pdf") as doc:
+            for page in doc:
+                yield page.get_pixmap(dpi=OCR_PDF_DPI).tobytes("png")
+    else:
+        with Image.open(io.BytesIO(contents)) as image:
+            for frame in ImageSequence.Iterator(image):
+                buffer = io.BytesIO()
+                frame.convert('RGB').save(buffer, format='PNG')
+                yield buffer.getvalue()
+
+def ocr_page_batch(ocr_model, ocr_type: str, pages: List[bytes]) -> List[str]:
+    """Run a batch of page images through OCR.predict and format each page"""
+    tmp_paths = []
     try:
-        knowledge_base.initialize()
+        for page in pages:
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp_file:
+                tmp_file.write(page)
+                tmp_paths.append(tmp_file.name)
+        
+        text_list = predict_ocr(ocr_model, ocr_type, tmp_paths)
+        texts = []
+        for i in range(len(tmp_paths)):
+            if text_list and i < len(text_list) and text_list[i]:
+                texts.append(line_print(text_list[i]))
+            else:
+                texts.append("No text detected")
+        return texts
+    finally:
+        for tmp_path in tmp_paths:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+async def stream_document_ocr(ocr_model, contents: bytes, doc_format: str, ocr_type: str, filename: Optional[str]):
+    """Yield NDJSON lines with per-page OCR results as each batch finishes"""
+    pages = iter_document_pages(contents, doc_format)
+    # The page generator is only ever advanced and closed from this one thread,
+    # so a client disconnect cannot close it while a page is being decoded
+    decoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ocr-decode")
+    loop = asyncio.get_running_loop()
+    page_number = 0
+    try:
+        while True:
+            batch = await loop.run_in_executor(decoder, lambda: list(islice(pages, OCR_PAGE_BATCH_SIZE)))
+            if not batch:
+                break
+            texts = await run_in_threadpool(ocr_page_batch, ocr_model, ocr_type, batch)
+            for text in texts:
+                page_number += 1
+                yield json.dumps({
+                    "success": True,
+                    "page": page_number,
+                    "text": text,
+                    "type": ocr_type,
+                    "filename": filename
+                }, ensure_ascii=False) + "\n"
+        yield json.dumps({"success": True, "done": True, "pages": page_number, "filename": filename}) + "\n"
     except Exception as e:
-        logger.error(f"Error initializing knowledge base: {str(e)}")
+        logger.error(f"{ocr_type} document OCR error on page {page_number + 1}: {str(e)}")
+        yield json.dumps({
+            "success": False,
+            "done": True,
+            "pages": page_number,
+            "error": f"Error processing page {page_number + 1}: {str(e)}",
+            "filename": filename
+        }) + "\n"
+    finally:
+        decoder.submit(pages.close)
+        decoder.shutdown(wait=False)
+
+def document_ocr_response(ocr_model, contents: bytes, doc_format: str, ocr_type: str, filename: Optional[str]) -> StreamingResponse:
+    """Stream per-page OCR results for a multi-page upload as NDJSON"""
+    return StreamingResponse(
+        stream_document_ocr(ocr_model, contents, doc_format, ocr_type, filename),
+        media_type="application/x-ndjson"
+    )
+
+@app.on_event("startup")
+async def startup_event():
+    """Load models for the subsystems enabled on this worker"""
+    logger.info(f"Enabled subsystems: {', '.join(sorted(ENABLED_SUBSYSTEMS)) or 'none'}")
+    if "brahmi" in ENABLED_SUBSYSTEMS:
+        load_brahmi_model()
+    if "ocr" in ENABLED_SUBSYSTEMS:
+        initialize_ocr()
+    if "chatbot" in ENABLED_SUBSYSTEMS:
+        # Initialize knowledge base in background
+        try:
+            knowledge_base.initialize()
+        except Exception as e:
+            logger.error(f"Error initializing knowledge base: {str(e)}")
+        if os.getenv("KB_WATCH", "").lower() in ("1", "true", "yes"):
+            knowledge_base.start_watcher(float(os.getenv("KB_WATCH_INTERVAL", "5")))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background knowledge base work"""
+    knowledge_base.stop_watcher()
 
 def preprocess_image(image: Image.Image, target_size: tuple = IM_SHAPE[:2]) -> np.ndarray:
     """Preprocess image for Brahmi model prediction"""
@@ -215,6 +359,7 @@ async def root():
     """Health check endpoint"""
     return {
         "message": "Tamil OCR API is running", 
+        "subsystems": sorted(ENABLED_SUBSYSTEMS),
         "brahmi_model_loaded": model_loaded,
         "ocr_initialized": ocr_initialized
     }
@@ -224,6 +369,7 @@ async def ocr_handwritten_endpoint(file: UploadFile = File(...)):
     """OCR for handwritten Tamil text"""
     global ocr_handwritten, ocr_initialized
     
+    require_subsystem("ocr")
     if not ocr_initialized or ocr_handwritten is None:
         raise HTTPException(status_code=500, detail="OCR models not initialized")
     
@@ -231,15 +377,19 @@ async def ocr_handwritten_endpoint(file: UploadFile = File(...)):
         # Read and process image
         contents = await file.read()
         
+        # Multi-page PDF/TIFF uploads stream per-page results as NDJSON
+        doc_format = detect_document_format(contents, file.filename, file.content_type)
+        if doc_format:
+            return document_ocr_response(ocr_handwritten, contents, doc_format, "handwritten", file.filename)
+        
         # Save temporary file for OCR processing
-        import tempfile
         with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
             tmp_file.write(contents)
             tmp_file_path = tmp_file.name
         
         try:
             # Use ocr_tamil for handwritten text
-            text_list = ocr_handwritten.predict([tmp_file_path])
+            text_list = await run_in_threadpool(predict_ocr, ocr_handwritten, "handwritten", [tmp_file_path])
             
             if text_list and len(text_list) > 0:
                 # Format the output with line breaks
@@ -249,7 +399,6 @@ async def ocr_handwritten_endpoint(file: UploadFile = File(...)):
                 
         finally:
             # Clean up temporary file
-            import os
             if os.path.exists(tmp_file_path):
                 os.unlink(tmp_file_path)
         
@@ -269,6 +418,7 @@ async def ocr_natural_endpoint(file: UploadFile = File(...)):
     """OCR for natural scene Tamil text"""
     global ocr_natural, ocr_initialized
     
+    require_subsystem("ocr")
     if not ocr_initialized or ocr_natural is None:
         raise HTTPException(status_code=500, detail="OCR models not initialized")
     
@@ -276,15 +426,19 @@ async def ocr_natural_endpoint(file: UploadFile = File(...)):
         # Read and process image
         contents = await file.read()
         
+        # Multi-page PDF/TIFF uploads stream per-page results as NDJSON
+        doc_format = detect_document_format(contents, file.filename, file.content_type)
+        if doc_format:
+            return document_ocr_response(ocr_natural, contents, doc_format, "natural", file.filename)
+        
         # Save temporary file for OCR processing
-        import tempfile
         with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
             tmp_file.write(contents)
             tmp_file_path = tmp_file.name
         
         try:
             # Use ocr_tamil for natural scene text
-            text_list = ocr_natural.predict([tmp_file_path])
+            text_list = await run_in_threadpool(predict_ocr, ocr_natural, "natural", [tmp_file_path])
             
             if text_list and len(text_list) > 0:
                 # Format the output with line breaks
@@ -294,7 +448,6 @@ async def ocr_natural_endpoint(file: UploadFile = File(...)):
                 
         finally:
             # Clean up temporary file
-            import os
             if os.path.exists(tmp_file_path):
                 os.unlink(tmp_file_path)
         
@@ -312,6 +465,7 @@ async def ocr_natural_endpoint(file: UploadFile = File(...)):
 @app.post("/ocr/brahmi")
 async def ocr_brahmi_endpoint(file: UploadFile = File(...)):
     """OCR for Brahmi script using custom model"""
+    require_subsystem("brahmi")
     try:
         # Validate file type
         if not file.content_type or not file.content_type.startswith('image/'):
@@ -362,12 +516,14 @@ async def transcribe_text_endpoint(
     output_script: str = Form(...)
 ):
     """Transcribe text between different scripts using Aksharamukha"""
+    require_subsystem("transcribe")
     try:
         if not text.strip():
             raise HTTPException(status_code=400, detail="Text cannot be empty")
         
         # Use Aksharamukha for transliteration
         try:
+            from aksharamukha.transliterate import Transliterator
             transliterator = Transliterator()
             transliterated_text = transliterator.tr(text, input_script, output_script)
         except Exception as e:
@@ -438,15 +594,33 @@ async def get_available_scripts():
 # Chatbot endpoints
 class ChatRequest(BaseModel):
     message: str
-    conversation_history: list = []  # List of previous messages in format [{"role": "user/bot", "text": "..."}]
+    session_id: Optional[str] = None  # Server-side session; replaces resending the full history
+    conversation_history: list = []  # Legacy: previous messages in format [{"role": "user/bot", "text": "..."}], used to seed a new session
 
 class ChatResponse(BaseModel):
     answer: str
     sources: list = []
+    session_id: Optional[str] = None
+
+def get_chat_session(request: ChatRequest) -> ChatSession:
+    """Resume the request's session, or start one seeded from any supplied history"""
+    session = chat_sessions.get(request.session_id)
+    if session is None:
+        if request.session_id and not request.conversation_history:
+            # Expired or lost on restart; the client should resend its history to reseed
+            raise HTTPException(status_code=410, detail="Chat session expired")
+        session = chat_sessions.create()
+        history = list(request.conversation_history)
+        # Older clients include the current message as the last history entry
+        if history and (history[-1].get('text') or history[-1].get('content')) == request.message:
+            history = history[:-1]
+        session.load_history(history)
+    return session
 
 @app.post("/chatbot/chat")
 async def chatbot_chat(request: ChatRequest):
     """Chat with AI assistant using knowledge base"""
+    require_subsystem("chatbot")
     try:
         if not request.message or not request.message.strip():
             raise HTTPException(status_code=400, detail="Message cannot be empty")
@@ -455,6 +629,8 @@ async def chatbot_chat(request: ChatRequest):
         if not knowledge_base.initialized:
             knowledge_base.initialize()
         
+        session = get_chat_session(request)
+        
         # Check if question is about the conversation itself
         query_lower = request.message.lower()
         is_conversation_query = any(phrase in query_lower for phrase in [
@@ -463,38 +639,32 @@ async def chatbot_chat(request: ChatRequest):
             'what questions did i ask', 'my questions'
         ])
         
-        if is_conversation_query and request.conversation_history:
-            # Extract user questions from conversation history
-            user_questions = [
-                msg.get('text', '') for msg in request.conversation_history 
-                if msg.get('role') == 'user' or msg.get('sender') == 'user'
-            ]
-            
-            if user_questions:
-                first_question = user_questions[0] if user_questions else None
-                if 'first' in query_lower and first_question:
-                    return {
-                        "success": True,
-                        "answer": f"Your first question was: \"{first_question}\"",
-                        "sources": []
-                    }
-                elif user_questions:
-                    questions_list = "\n".join([f"{i+1}. {q}" for i, q in enumerate(user_questions)])
-                    return {
-                        "success": True,
-                        "answer": f"Here are the questions you've asked in this conversation:\n\n{questions_list}",
-                        "sources": []
-                    }
+        if is_conversation_query and session.questions:
+            user_questions = list(session.questions)
+            if 'first' in query_lower:
+                answer = f"Your first question was: \"{user_questions[0]}\""
+            else:
+                questions_list = "\n".join([f"{i+1}. {q}" for i, q in enumerate(user_questions)])
+                answer = f"Here are the questions you've asked in this conversation:\n\n{questions_list}"
+            chat_sessions.record(session, request.message, answer)
+            return {
+                "success": True,
+                "answer": answer,
+                "sources": [],
+                "session_id": session.id
+            }
         
         # Search for relevant chunks
         relevant_chunks = knowledge_base.search_relevant_chunks(request.message, top_k=3)
         
-        # Generate answer with conversation history
+        # Generate answer with the session's compacted history
         answer = knowledge_base.generate_answer(
             request.message, 
             relevant_chunks,
-            conversation_history=request.conversation_history
+            conversation_history=session.messages,
+            history_summary=session.summary
         )
+        chat_sessions.record(session, request.message, answer, summarize=knowledge_base.summarize_history)
         
         # Get unique sources
         sources = list(set([chunk['source'] for chunk in relevant_chunks]))
@@ -502,18 +672,38 @@ async def chatbot_chat(request: ChatRequest):
         return {
             "success": True,
             "answer": answer,
-            "sources": sources
+            "sources": sources,
+            "session_id": session.id
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Chatbot error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing chat: {str(e)}")
 
+@app.delete("/chatbot/sessions/{session_id}")
+async def delete_chat_session(session_id: str):
+    """Discard a chat session's server-side history"""
+    require_subsystem("chatbot")
+    if not chat_sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"success": True}
+
 @app.post("/chatbot/initialize")
 async def initialize_knowledge_base():
-    """Manually initialize the knowledge base"""
+    """Manually initialize the knowledge base, or pick up changed PDFs once initialized"""
+    require_subsystem("chatbot")
     try:
-        knowledge_base.initialize()
+        if knowledge_base.initialized:
+            # Rebuild in the background; queries keep using the current index until the swap
+            knowledge_base.submit(knowledge_base.sync)
+            return {
+                "success": True,
+                "message": "Knowledge base reindexing started",
+                "num_chunks": len(knowledge_base.documents)
+            }
+        await run_in_threadpool(knowledge_base.initialize)
         return {
             "success": True,
             "message": f"Knowledge base initialized with {len(knowledge_base.documents)} chunks",
@@ -526,12 +716,77 @@ async def initialize_knowledge_base():
 @app.get("/chatbot/status")
 async def chatbot_status():
     """Get chatbot status"""
+    require_subsystem("chatbot")
     return {
         "initialized": knowledge_base.initialized,
-        "num_documents": len(knowledge_base.documents),
+        "reindexing": knowledge_base.reindexing,
+        "num_documents": len(knowledge_base.list_documents()),
         "num_chunks": len(knowledge_base.documents)
     }
 
+@app.get("/chatbot/documents")
+async def list_knowledge_base_documents():
+    """List indexed PDFs"""
+    require_subsystem("chatbot")
+    return {"documents": knowledge_base.list_documents()}
+
+@app.post("/chatbot/documents")
+async def upload_knowledge_base_document(file: UploadFile = File(...)):
+    """Add or replace a PDF in the knowledge base; it is indexed in the background"""
+    require_subsystem("chatbot")
+    filename = os.path.basename(file.filename or "")
+    if not filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="File must be a PDF")
+    
+    contents = await file.read()
+    if not contents:
+        raise HTTPException(status_code=400, detail="Empty file uploaded")
+    
+    try:
+        os.makedirs(knowledge_base.data_folder, exist_ok=True)
+        pdf_path = os.path.join(knowledge_base.data_folder, filename)
+        # Write then rename so the watcher never indexes a partial file
+        tmp_path = pdf_path + ".part"
+        with open(tmp_path, 'wb') as f:
+            f.write(contents)
+        os.replace(tmp_path, pdf_path)
+        knowledge_base.submit(knowledge_base.add_document, pdf_path)
+    except Exception as e:
+        logger.error(f"Error adding document {filename}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error adding document: {str(e)}")
+    
+    return {
+        "success": True,
+        "message": f"{filename} queued for indexing",
+        "filename": filename
+    }
+
+@app.delete("/chatbot/documents/{filename}")
+async def delete_knowledge_base_document(filename: str):
+    """Remove a PDF from the knowledge base and the data folder"""
+    require_subsystem("chatbot")
+    filename = os.path.basename(filename)
+    if not filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="File must be a PDF")
+    pdf_path = os.path.join(knowledge_base.data_folder, filename)
+    indexed = any(doc['filename'] == filename for doc in knowledge_base.list_documents())
+    if not indexed and not os.path.exists(pdf_path):
+        raise HTTPException(status_code=404, detail=f"Document not found: {filename}")
+    
+    try:
+        if os.path.exists(pdf_path):
+            os.unlink(pdf_path)
+        knowledge_base.submit(knowledge_base.remove_document, filename)
+    except Exception as e:
+        logger.error(f"Error removing document {filename}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error removing document: {str(e)}")
+    
+    return {
+        "success": True,
+        "message": f"{filename} queued for removal",
+        "filename": filename
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
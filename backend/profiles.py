@@ -0,0 +1,34 @@
+"""
+Deployment profiles selecting which backend subsystems a worker enables
+"""
+import os
+from typing import FrozenSet
+
+SUBSYSTEMS = ("brahmi", "ocr", "transcribe", "chatbot")
+
+# Profile name -> subsystems loaded at startup and served by the worker
+PROFILES = {
+    "full": SUBSYSTEMS,
+    "ocr": ("brahmi", "ocr"),
+    "tamil-ocr": ("ocr",),
+    "brahmi": ("brahmi",),
+    "transcribe": ("transcribe",),
+    "chatbot": ("chatbot",),
+}
+
+DEFAULT_PROFILE = "full"
+
+def enabled_subsystems() -> FrozenSet[str]:
+    """Resolve enabled subsystems from BACKEND_SUBSYSTEMS or BACKEND_PROFILE"""
+    explicit = os.getenv("BACKEND_SUBSYSTEMS")
+    if explicit is not None:
+        names = {name.strip() for name in explicit.split(",") if name.strip()}
+        unknown = names - set(SUBSYSTEMS)
+        if unknown:
+            raise ValueError(f"Unknown subsystem(s) in BACKEND_SUBSYSTEMS: {', '.join(sorted(unknown))}")
+        return frozenset(names)
+    
+    profile = os.getenv("BACKEND_PROFILE", DEFAULT_PROFILE)
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown BACKEND_PROFILE '{profile}'. Available: {', '.join(PROFILES)}")
+    return frozenset(PROFILES[profile])
@@ -5,6 +5,15 @@ import { toast } from 'react-toastify';
 import './Chatbot.css';
 import { chatWithBot, getChatbotStatus } from '../utils/api';
 
+// Local copy of the conversation, used to reseed an expired server-side session
+const buildConversationHistory = (messages) => messages
+  .filter(msg => msg.sender !== 'bot' || !msg.text.includes("Hello! I'm your AI assistant"))
+  .map(msg => ({
+    role: msg.sender === 'user' ? 'user' : 'assistant',
+    text: msg.text,
+    sender: msg.sender
+  }));
+
 const Chatbot = () => {
   const [messages, setMessages] = useState([]);
   const [inputMessage, setInputMessage] = useState('');
@@ -14,6 +23,8 @@ const Chatbot = () => {
   const messagesContainerRef = useRef(null);
   const pendingRequestRef = useRef(null);
   const requestIdRef = useRef(0);
+  // Server keeps the conversation history for this session
+  const sessionIdRef = useRef(null);
 
   useEffect(() => {
     // Check chatbot status on mount
@@ -126,15 +137,9 @@ const Chatbot = () => {
     // Add user message and make API call
     setMessages(prev => {
       const updatedMessages = [...prev, userMessage];
-      const conversationHistory = updatedMessages
-        .filter(msg => msg.sender !== 'bot' || !msg.text.includes("Hello! I'm your AI assistant"))
-        .map(msg => ({
-          role: msg.sender === 'user' ? 'user' : 'assistant',
-          text: msg.text,
-          sender: msg.sender
-        }));
+      const conversationHistory = buildConversationHistory(updatedMessages);
       
-      // Make API call with conversation history (use setTimeout to ensure state is updated)
+      // Make API call within the server-side session (use setTimeout to ensure state is updated)
       const currentRequestId = ++requestIdRef.current;
       setTimeout(() => {
         // Check if this is still the latest request
@@ -142,7 +147,7 @@ const Chatbot = () => {
           return;
         }
         
-        const requestPromise = chatWithBot(question, conversationHistory);
+        const requestPromise = chatWithBot(question, sessionIdRef.current, conversationHistory);
         pendingRequestRef.current = requestPromise;
         
         requestPromise.then(response => {
@@ -151,6 +156,7 @@ const Chatbot = () => {
             return;
           }
           pendingRequestRef.current = null;
+          sessionIdRef.current = response.session_id || sessionIdRef.current;
           
           const botMessage = {
             id: Date.now() + 1,
@@ -231,17 +237,9 @@ const Chatbot = () => {
     // Add user message first
     setMessages(prev => {
       const allMessages = [...prev, userMessage];
+      const conversationHistory = buildConversationHistory(allMessages);
       
-      // Build conversation history
-      const conversationHistory = allMessages
-        .filter(msg => msg.sender !== 'bot' || !msg.text.includes("Hello! I'm your AI assistant"))
-        .map(msg => ({
-          role: msg.sender === 'user' ? 'user' : 'assistant',
-          text: msg.text,
-          sender: msg.sender
-        }));
-      
-      // Make API call with conversation history (use setTimeout to ensure state is updated)
+      // Make API call within the server-side session (use setTimeout to ensure state is updated)
       const currentRequestId = ++requestIdRef.current;
       setTimeout(() => {
         // Check if this is still the latest request
@@ -249,7 +247,7 @@ const Chatbot = () => {
           return;
         }
         
-        const requestPromise = chatWithBot(currentInput, conversationHistory);
+        const requestPromise = chatWithBot(currentInput, sessionIdRef.current, conversationHistory);
         pendingRequestRef.current = requestPromise;
         
         requestPromise.then(response => {
@@ -258,6 +256,7 @@ const Chatbot = () => {
             return;
           }
           pendingRequestRef.current = null;
+          sessionIdRef.current = response.session_id || sessionIdRef.current;
           
           const botMessage = {
             id: Date.now() + 1,
@@ -60,18 +60,25 @@ export const fetchScripts = async () => {
 };
 
 // Chatbot endpoints
-export const chatWithBot = async (message, conversationHistory = []) => {
-  const response = await fetch(`${API_BASE_URL}/chatbot/chat`, {
+export const chatWithBot = async (message, sessionId = null, conversationHistory = []) => {
+  const send = (body) => fetch(`${API_BASE_URL}/chatbot/chat`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
     },
-    body: JSON.stringify({ 
-      message,
-      conversation_history: conversationHistory
-    }),
+    body: JSON.stringify({ message, ...body }),
   });
 
+  // The server keeps history per session; only the first message of a session sends it
+  let response = await send(sessionId
+    ? { session_id: sessionId }
+    : { conversation_history: conversationHistory });
+
+  // Session expired or the server restarted: start a new one from the local history
+  if (response.status === 410) {
+    response = await send({ conversation_history: conversationHistory });
+  }
+
   if (!response.ok) {
     const errorData = await response.json();
     throw new Error(errorData.detail || 'Failed to get response from chatbot');
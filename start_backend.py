@@ -2,6 +2,7 @@
 """
 Startup script for the Tamil OCR backend
 """
+import argparse
 import uvicorn
 import os
 import sys
@@ -9,8 +10,31 @@ import sys
 # Add the backend directory to Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
 
+from profiles import PROFILES, DEFAULT_PROFILE, enabled_subsystems
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Start the Tamil OCR backend")
+    parser.add_argument("--profile", choices=list(PROFILES), default=os.getenv("BACKEND_PROFILE", DEFAULT_PROFILE),
+                        help="Deployment profile selecting which subsystems to load")
+    parser.add_argument("--no-reload", action="store_true", help="Disable auto-reload on code changes")
+    args = parser.parse_args()
+    # argparse does not check defaults against choices, so validate a BACKEND_PROFILE from the environment
+    if args.profile not in PROFILES:
+        parser.error(f"invalid BACKEND_PROFILE '{args.profile}' (choose from {', '.join(PROFILES)})")
+    
+    # Read by backend/profiles.py in the server (and reloader) process
+    os.environ["BACKEND_PROFILE"] = args.profile
+    try:
+        # BACKEND_SUBSYSTEMS, when set, overrides the profile
+        subsystems = enabled_subsystems()
+    except ValueError as e:
+        parser.error(str(e))
+    
     print("Starting Tamil OCR Backend...")
+    if os.getenv("BACKEND_SUBSYSTEMS") is not None:
+        print(f"Subsystems (from BACKEND_SUBSYSTEMS): {', '.join(sorted(subsystems)) or 'none'}")
+    else:
+        print(f"Profile: {args.profile} ({', '.join(sorted(subsystems))})")
     print("Backend will be available at: http://localhost:8000")
     print("API documentation at: http://localhost:8000/docs")
     print("Press Ctrl+C to stop the server")
@@ -23,6 +47,6 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        reload=not args.no_reload,
         reload_dirs=["backend"]
     )
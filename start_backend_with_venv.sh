@@ -28,4 +28,4 @@ echo "API documentation at: http://localhost:8000/docs"
 echo "Press Ctrl+C to stop the server"
 echo ""
 
-python3 start_backend.py
+python3 start_backend.py "$@"
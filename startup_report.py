@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Report import time, startup time and peak RSS of the backend for each deployment profile
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+sys.path.append(BACKEND_DIR)
+
+from profiles import PROFILES
+
+# Runs in a fresh interpreter per profile so imports are measured cold
+MEASURE_SCRIPT = r"""
+import asyncio, json, resource, sys, time
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+sys.path.insert(0, sys.argv[1])
+start = time.perf_counter()
+import main
+import_seconds = time.perf_counter() - start
+import_rss = peak_rss_mb()
+
+startup_seconds = None
+if sys.argv[2] == "startup":
+    start = time.perf_counter()
+    asyncio.run(main.startup_event())
+    startup_seconds = time.perf_counter() - start
+
+print(json.dumps({
+    "import_seconds": import_seconds,
+    "import_rss_mb": import_rss,
+    "startup_seconds": startup_seconds,
+    "peak_rss_mb": peak_rss_mb(),
+}))
+"""
+
+def measure(profile: str, run_startup: bool) -> dict:
+    """Measure one profile in a subprocess"""
+    env = dict(os.environ, BACKEND_PROFILE=profile)
+    env.pop("BACKEND_SUBSYSTEMS", None)
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE_SCRIPT, BACKEND_DIR, "startup" if run_startup else "import"],
+        env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("profiles", nargs="*", default=list(PROFILES), help="Profiles to measure (default: all)")
+    parser.add_argument("--startup", action="store_true",
+                        help="Also run the startup hook (loads models and builds the knowledge base)")
+    args = parser.parse_args()
+    
+    print(f"{'profile':<12} {'import (s)':>10} {'import RSS (MB)':>16} {'startup (s)':>12} {'peak RSS (MB)':>14}")
+    for profile in args.profiles:
+        stats = measure(profile, args.startup)
+        if "error" in stats:
+            print(f"{profile:<12} error: {stats['error']}")
+            continue
+        startup = f"{stats['startup_seconds']:.2f}" if stats["startup_seconds"] is not None else "-"
+        print(f"{profile:<12} {stats['import_seconds']:>10.2f} {stats['import_rss_mb']:>16.1f} "
+              f"{startup:>12} {stats['peak_rss_mb']:>14.1f}")
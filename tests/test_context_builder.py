@@ -0,0 +1,75 @@
+from chat_sessions import SessionStore
+from context_builder import ContextBuilder, count_tokens, merge_overlapping_chunks, _word_overlap
+
+
+def window_chunks(words, source='book.pdf'):
+    # Mirrors KnowledgeBase.chunk_text: 1000-word windows stepping by 800
+    return [
+        {'text': ' '.join(words[i:i + 1000]), 'source': source, 'chunk_index': n, 'similarity': 0.5}
+        for n, i in enumerate(range(0, len(words), 800))
+    ]
+
+
+def test_merge_removes_chunker_overlap():
+    words = [f'w{i}' for i in range(1800)]
+    passages = merge_overlapping_chunks(window_chunks(words)[:2])
+
+    assert len(passages) == 1
+    assert passages[0]['text'].split() == words
+
+
+def test_short_coincidental_overlap_is_kept():
+    assert _word_overlap(['a', 'the'], ['the', 'b']) == 0
+
+    chunks = [
+        {'text': 'the script of the', 'source': 'a.pdf', 'chunk_index': 0},
+        {'text': 'the Pallava kings', 'source': 'a.pdf', 'chunk_index': 1},
+    ]
+    assert merge_overlapping_chunks(chunks)[0]['text'] == 'the script of the the Pallava kings'
+
+
+def test_final_chunk_contained_in_previous_is_deduplicated():
+    words = [f'w{i}' for i in range(1650)]
+    chunks = window_chunks(words)
+    assert len(chunks[-1]['text'].split()) == 50
+
+    passages = merge_overlapping_chunks(chunks[1:])
+    assert passages[0]['text'].split() == words[800:]
+
+
+def test_long_answer_does_not_empty_history():
+    answer = ' '.join(f'Sentence {i} about the Brahmi script and its descendants.' for i in range(60))
+    messages = [
+        {'role': 'user', 'text': 'Who deciphered Brahmi?'},
+        {'role': 'assistant', 'text': answer},
+    ]
+    history = ContextBuilder(max_history_tokens=400).build_history(messages)
+
+    assert 'User: Who deciphered Brahmi?' in history
+    assert 'Assistant: Sentence 0' in history
+    assert count_tokens(history) <= 400
+
+
+def test_summary_is_trimmed_not_dropped():
+    summary = ' '.join(f'fact{i}' for i in range(500))
+    history = ContextBuilder(max_history_tokens=400).build_history(
+        [{'role': 'user', 'text': 'And Tamil?'}], summary
+    )
+
+    assert history.startswith('Summary of earlier conversation: ')
+    assert 'fact499' in history
+    assert 'User: And Tamil?' in history
+    assert count_tokens(history) <= 400
+
+
+def test_fallback_summary_survives_build_history():
+    store = SessionStore(max_history_tokens=100)
+    session = store.create()
+    for i in range(4):
+        store.record(session, f'question {i} ' * 10, 'answer ' * 30)
+
+    assert session.summary
+    assert len(session.messages) == 4
+    assert session.questions[0].startswith('question 0')
+    history = ContextBuilder(max_history_tokens=100).build_history(session.messages, session.summary)
+    assert history.startswith('Summary of earlier conversation: ' + session.summary)
@@ -0,0 +1,65 @@
+import pytest
+
+from knowledge_base import KnowledgeBase
+
+
+def fake_embedding(text):
+    # Deterministic 3-d embedding: different words point in different directions
+    return [float(text.count('brahmi')), float(text.count('tamil')), 1.0]
+
+
+@pytest.fixture
+def kb(tmp_path, monkeypatch):
+    kb = KnowledgeBase(data_folder=str(tmp_path))
+    monkeypatch.setattr(kb, 'get_embedding', fake_embedding)
+    monkeypatch.setattr(kb, 'extract_text_from_pdf', lambda path: open(path, encoding='utf-8').read())
+    return kb
+
+
+def write_pdf(folder, name, text):
+    path = folder / name
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def test_search_against_published_index(kb, tmp_path):
+    write_pdf(tmp_path, 'scripts.pdf', 'brahmi ' * 50)
+    kb.add_document(write_pdf(tmp_path, 'tamil.pdf', 'tamil ' * 50))
+
+    results = kb.search_relevant_chunks('tamil', top_k=1)
+
+    assert [r['source'] for r in results] == ['tamil.pdf']
+    assert results[0]['chunk_index'] == 0
+
+
+def test_sync_only_embeds_changed_chunks(kb, tmp_path):
+    calls = []
+    kb.get_embedding = lambda text: calls.append(text) or fake_embedding(text)
+    write_pdf(tmp_path, 'book.pdf', ' '.join(f'w{i}' for i in range(2000)))
+    kb.initialize()
+    assert len(calls) == 3
+
+    calls.clear()
+    write_pdf(tmp_path, 'book.pdf', ' '.join(f'w{i}' for i in range(2000)) + ' extra')
+    kb._index[2]['book.pdf']['signature'] = None  # force a re-read regardless of mtime resolution
+    assert kb.sync()['updated'] == ['book.pdf']
+    assert len(calls) == 1
+    assert len(kb.documents) == 3
+
+
+def test_failed_embedding_keeps_chunk_positions(kb, tmp_path):
+    kb.get_embedding = lambda text: [] if text.startswith('w800 ') else fake_embedding(text)
+    kb.add_document(write_pdf(tmp_path, 'book.pdf', ' '.join(f'w{i}' for i in range(2000))))
+
+    assert [doc['chunk_index'] for doc in kb.documents] == [0, 2]
+
+
+def test_sync_keeps_uppercase_pdf_and_removes_deleted(kb, tmp_path):
+    kb.add_document(write_pdf(tmp_path, 'Book.PDF', 'tamil ' * 10))
+    assert kb.sync()['removed'] == []
+    assert [doc['filename'] for doc in kb.list_documents()] == ['Book.PDF']
+
+    (tmp_path / 'Book.PDF').unlink()
+    assert kb.sync()['removed'] == ['Book.PDF']
+    assert kb.documents == []
+    assert kb.search_relevant_chunks('tamil') == []